@@ -15,12 +15,21 @@ generate synthetic training data and test out the fine-tuned model.
 
 import streamlit as st
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 import json
-import time
 import re
+import functools
+import unicodedata
 import os
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from urllib.parse import urlparse
+
+import diskcache
+
+import fast_dom
 
 # DEPENDENCY CHECK: Graceful Degradation for Anti-Bot
 try:
@@ -28,19 +37,73 @@ try:
     from selenium.webdriver.common.by import By
     from selenium.webdriver.support.ui import WebDriverWait
     from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
     from selenium_stealth import stealth
     SELENIUM_AVAILABLE = True
 except ImportError:
     SELENIUM_AVAILABLE = False
 
+# DEPENDENCY CHECK: Fast JSON (orjson is 2-5x faster than stdlib json)
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    json_loads = json.loads
+    def json_dumps(obj):
+        return json.dumps(obj).encode('utf-8')
+
 # CONFIGURATION
 st.set_page_config(page_title="Self-Healing Scraper", page_icon="🚑", layout="wide")
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA_HOST = "http://localhost:11434"
+OLLAMA_URL = f"{OLLAMA_HOST}/api/chat"
 OLLAMA_MODEL = "dom-specialist"  # The model you created with 'ollama create'
+OLLAMA_KEEP_ALIVE = "30m"  # Keep the model (and its KV cache) resident between runs
 ANTI_BOT_SITES = ['stockx.com', 'nike.com', 'adidas.com', 'footlocker.com', 'shopify.com']
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)'
+
+# HTTP SESSION (Connection Pooling)
+@st.cache_resource
+def build_session():
+    """One pooled session per server process, so TCP/TLS connections survive Streamlit reruns."""
+    session = requests.Session()
+    session.mount('http://', HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=1))
+    session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=20))
+    session.headers.update({'User-Agent': USER_AGENT})
+    return session
+
+SESSION = build_session()
+
+# SELECTOR CACHE (Persistent, LRU-evicted)
+SELECTOR_CACHE_DIR = ".selector_cache"
+SELECTOR_CACHE_SIZE_LIMIT = 50 * 2**20  # 50 MB
+
+@st.cache_resource
+def open_selector_cache():
+    """Verified selectors keyed by (domain, intent). Shared across sessions; diskcache is thread-safe."""
+    return diskcache.Cache(SELECTOR_CACHE_DIR, size_limit=SELECTOR_CACHE_SIZE_LIMIT, eviction_policy='least-recently-used')
+
+SELECTOR_CACHE = open_selector_cache()
+
+def selector_cache_key(url, intent):
+    return f"{urlparse(url).netloc}|{intent.strip().lower()}"
 
 # CORE LOGIC CLASSES
+class _TokenTable(dict):
+    """
+    str.translate table mapping Unicode punctuation and symbols (…, «», —, ...) to spaces, so tokens split
+    exactly where the old \\w+ regex did ('_' is a word character and stays). Filled lazily per code point.
+    """
+    def __missing__(self, code):
+        ch = chr(code)
+        self[code] = ' ' if ch != '_' and unicodedata.category(ch)[0] in 'PS' else ch
+        return self[code]
+
+_TOKEN_TABLE = _TokenTable()
+_LD_FIELDS = (('name', 'name'), ('description', 'description'))  # (JSON-LD key, output key)
+_STOP_WORDS = frozenset({"extract", "find", "get", "the", "a", "an", "of", "value", "text", "name", "movie", "page", "webpage", "site"})
+
 class ScraperLogic:
     @staticmethod
     def extract_subject(intent):
@@ -48,35 +111,37 @@ class ScraperLogic:
         NLP Logic: Extracts the 'Subject' from the query to focus the AI's vision.
         Input: "Extract the movie director name" -> Output: "director"
         """
-        stop_words = {"extract", "find", "get", "the", "a", "an", "of", "value", "text", "name", "movie", "page", "webpage", "site"}
-        words = re.findall(r'\w+', intent.lower())
-        candidates = [w for w in words if w not in stop_words]
+        words = intent.lower().translate(_TOKEN_TABLE).split()
+        candidates = [w for w in words if w not in _STOP_WORDS]
         return candidates[-1] if candidates else (words[-1] if words else "data")
 
     @staticmethod
-    def smart_clean_html(html_content, target_keyword=None):
+    def extract_subjects(intents):
+        """Batch version of extract_subject for scraping many intents in one go."""
+        return [ScraperLogic.extract_subject(intent) for intent in intents]
+
+    @staticmethod
+    def smart_clean_html(tree, target_keyword=None):
         """
         Context Engineering: Reduces HTML noise to prevent token overflow.
+        Works on a copy of the already-parsed tree, so the caller's DOM stays intact.
+        Returns (html_window, text_structure), where text_structure() builds the page text on demand.
         """
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # 1. Remove non-content tags
-        for element in soup(["script", "style", "footer", "nav", "header", "svg", "button", "meta", "noscript", "iframe", "ad"]):
-            # Preserve JSON-LD scripts, remove others
-            if element.name == 'script' and element.get('type') == 'application/ld+json':
-                continue
-            element.decompose()
+        # 1. Remove non-content tags on a copy (JSON-LD scripts are preserved)
+        cleaned = fast_dom.strip_noise(fast_dom.clone(tree))
+        body = cleaned.body if cleaned.body is not None else cleaned
         
-        # 2. Extract Text Structure (for Fallback)
-        text_structure = soup.get_text(separator="\n", strip=True)
+        # 2. Extract Text Structure (for Fallback) -- deferred, only Strategy B reads it
+        text_structure = functools.partial(fast_dom.text, body)
         
-        # 3. Create Focused HTML Window
-        body_text = str(soup.body) if soup.body else str(soup)
+        # 3. Create Focused HTML Window (searched after cleaning, so nav links and inline scripts can't capture it)
+        body_text = fast_dom.outer_html(body)
         
         if target_keyword:
-            # Find the keyword in the raw HTML
-            idx = body_text.lower().find(target_keyword.lower())
-            if idx != -1:
+            # Find the keyword in the cleaned HTML (case-insensitive, without a lowercased copy of the page)
+            match = re.search(re.escape(target_keyword), body_text, re.IGNORECASE)
+            if match:
+                idx = match.start()
                 # Create a window: 500 chars before, 1500 chars after (Tighter window to avoid distraction)
                 start = max(0, idx - 500)
                 end = min(len(body_text), idx + 1500)
@@ -85,99 +150,190 @@ class ScraperLogic:
         return body_text[:4000], text_structure
 
     @staticmethod
-    def parse_json_ld(soup):
-        """Extracts structured data (Product, Price) from JSON-LD tags."""
+    def parse_json_ld(blocks):
+        """Extracts structured data (Product, Price) from the raw bodies of JSON-LD tags."""
         data_found = {}
-        scripts = soup.find_all('script', type='application/ld+json')
         
-        for script in scripts:
+        for block in blocks:
             try:
-                data = json.loads(script.string)
-                if isinstance(data, list): data = data[0] if data else {}
-                
-                # Standard E-Commerce Fields
-                if 'name' in data: data_found['name'] = data['name']
-                if 'description' in data: data_found['description'] = data['description']
-                if 'offers' in data:
-                    offer = data['offers'] if isinstance(data['offers'], dict) else data['offers'][0]
-                    data_found['price'] = f"{offer.get('priceCurrency', '')} {offer.get('price', '')}"
-            except:
+                data = json_loads(block)
+            except Exception:
                 continue
+            # Sites often wrap every entity (Product, BreadcrumbList, ...) in a top-level @graph
+            if isinstance(data, dict) and '@graph' in data: items = data['@graph']
+            else: items = data if isinstance(data, list) else [data]
+            
+            for item in items:
+                if not isinstance(item, dict): continue
+                
+                # Standard E-Commerce Fields (first entity wins: the main Product precedes variants, WebSite, ...)
+                for ld_key, out_key in _LD_FIELDS:
+                    if ld_key in item: data_found.setdefault(out_key, item[ld_key])
+                offers = item.get('offers')
+                if offers and 'price' not in data_found:
+                    offer = offers if isinstance(offers, dict) else offers[0]
+                    if isinstance(offer, dict):
+                        data_found['price'] = f"{offer.get('priceCurrency', '')} {offer.get('price', '')}"
         return data_found
 
 # AI INTERFACE (OLLAMA)
+# Shared by every call and kept byte-identical, so Ollama can reuse the cached prefix
+SYSTEM_PROMPT = """You are a DOM-aware agent. Analyze raw HTML or page text and answer the user's intent.
+- If asked for a Selector, return ONLY the CSS selector. Do not explain.
+- If asked for Data, return ONLY the entity requested.
+- If asked for Director, do NOT return Actors.
+- If asked for Price, do NOT return Tax."""
+
 def ask_ollama(prompt, temperature=0.1):
+    """Streams the reply and hangs up at the first newline (answers are a single line)."""
     try:
-        response = requests.post(OLLAMA_URL, json={
+        response = SESSION.post(OLLAMA_URL, data=json_dumps({
             "model": OLLAMA_MODEL,
-            "prompt": prompt,
-            "stream": False,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            "stream": True,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
             "options": {
                 "temperature": temperature,
                 "num_ctx": 8192,
                 "stop": ["<|im_end|>", "\n"]
             }
-        }, timeout=30)
+        }), headers={'Content-Type': 'application/json'}, timeout=30, stream=True)
         
-        if response.status_code == 200:
-            return response.json()['response'].strip()
-        return None
+        with response:
+            if response.status_code != 200:
+                return None
+            answer = ""
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json_loads(line)
+                answer += chunk.get('message', {}).get('content', '')
+                if chunk.get('done') or "\n" in answer:
+                    break
+        return answer.partition("\n")[0].strip()
     except Exception as e:
         st.error(f"Ollama Connection Error: {e}")
         return None
 
+@st.cache_data(ttl=10, show_spinner=False)
+def ollama_status():
+    """HTTP status of a HEAD probe (None if unreachable). Cached so widget reruns don't hammer Ollama."""
+    try:
+        return SESSION.head(f"{OLLAMA_HOST}/api/tags", timeout=1).status_code
+    except Exception:
+        return None
+
+def warm_ollama():
+    """Loads the model into memory (an empty prompt only triggers the load). Best effort."""
+    try:
+        SESSION.post(f"{OLLAMA_HOST}/api/generate", data=json_dumps({
+            "model": OLLAMA_MODEL,
+            "prompt": "",
+            "keep_alive": OLLAMA_KEEP_ALIVE
+        }), headers={'Content-Type': 'application/json'}, timeout=60)
+    except Exception:
+        pass  # ask_ollama surfaces real connection errors later
+
+@st.cache_resource
+def get_executor():
+    """Background workers shared across sessions (model warmup runs here)."""
+    return ThreadPoolExecutor(max_workers=2)
+
 def generate_selector(html_snippet, intent):
-    prompt = f"""<|im_start|>system
-You are a DOM-aware agent. Return ONLY the CSS selector for the user's intent. Do not explain.<|im_end|>
-<|im_start|>user
+    prompt = f"""Return ONLY the CSS selector for this intent.
 Intent: {intent}
 HTML:
-{html_snippet}<|im_end|>
-<|im_start|>assistant
-"""
+{html_snippet}"""
     return ask_ollama(prompt, temperature=0.1)
 
 def direct_extraction(text_context, intent):
-    prompt = f"""<|im_start|>system
-Extract the exact answer. 
-- Return ONLY the entity requested.
-- If asked for Director, do NOT return Actors.
-- If asked for Price, do NOT return Tax.<|im_end|>
-<|im_start|>user
+    prompt = f"""Extract the exact answer.
 Request: {intent}
 Context:
-{text_context}<|im_end|>
-<|im_start|>assistant
-"""
+{text_context}"""
     return ask_ollama(prompt, temperature=0.05)
 
 # BROWSER ENGINE
+@st.cache_resource
+def get_driver():
+    """Lazily launches one headless Chrome per server process (a cold launch costs seconds and hundreds of MB)."""
+    options = uc.ChromeOptions()
+    options.add_argument('--headless')
+    options.add_argument('--disable-gpu')
+    driver = uc.Chrome(options=options)
+    driver.set_page_load_timeout(20)
+    atexit.register(driver.quit)
+    return driver
+
+@st.cache_resource
+def get_driver_lock():
+    """A WebDriver can only drive one navigation at a time, so sessions take turns."""
+    return threading.Lock()
+
+def reset_driver(driver):
+    """Shuts down a crashed/hung browser and drops it from the cache, so the next request relaunches it."""
+    atexit.unregister(driver.quit)
+    try:
+        driver.quit()
+    except Exception:
+        pass  # Already dead
+    get_driver.clear()
+
+def wait_for_hydration(driver, timeout=5, poll_frequency=0.5, stable_polls=4):
+    """
+    driver.get() returns at the load event, before JS frameworks render their content.
+    Waits until the document is complete and the rendered DOM has stayed the same size for
+    `stable_polls` consecutive polls (~2s, longer than a typical skeleton-to-data fetch),
+    capped at `timeout` seconds.
+    """
+    state = {'size': -1, 'streak': 0}
+    def settled(d):
+        ready, size = d.execute_script(
+            "return [document.readyState, document.body ? document.body.innerHTML.length : 0]")
+        if ready == 'complete' and size > 0 and size == state['size']:
+            state['streak'] += 1
+        else:
+            state['streak'] = 0
+        state['size'] = size
+        return state['streak'] >= stable_polls
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=poll_frequency).until(settled)
+    except TimeoutException:
+        pass  # Still changing (tickers, carousels): use what has rendered so far
+
+def needs_stealth(url):
+    """True when the URL is a known Anti-Bot site and Selenium is installed."""
+    return SELENIUM_AVAILABLE and any(x in url for x in ANTI_BOT_SITES)
+
+@st.cache_data(ttl=300, show_spinner=False, max_entries=64)
 def fetch_html(url):
-    """Hybrid Fetcher: Uses Requests for speed, Selenium for Anti-Bot."""
+    """
+    Hybrid Fetcher: Uses Requests for speed, Selenium for Anti-Bot. Memoized per URL for 5 minutes.
+    Failures raise rather than return, since st.cache_data never caches exceptions.
+    """
     
     # 1. Check for Anti-Bot Sites
-    is_hard_target = any(x in url for x in ANTI_BOT_SITES)
-    
-    if is_hard_target and SELENIUM_AVAILABLE:
-        st.toast("🛡️ Anti-Bot Detected: Switching to Stealth Mode...", icon="🤖")
-        options = uc.ChromeOptions()
-        options.add_argument('--headless')
-        options.add_argument('--disable-gpu')
-        driver = uc.Chrome(options=options)
-        try:
-            driver.get(url)
-            time.sleep(5) # Wait for hydration
-            return driver.page_source
-        finally:
-            driver.quit()
+    if needs_stealth(url):
+        with get_driver_lock():
+            driver = get_driver()
+            try:
+                driver.get(url)
+                wait_for_hydration(driver)
+                return driver.page_source
+            except Exception as e:
+                reset_driver(driver)
+                # Reported by the handler as a failed load (and, being an exception, never cached)
+                raise RuntimeError(f"Stealth browser failed: {type(e).__name__}") from e
             
-    # 2. Standard Requests
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)'}
-        resp = requests.get(url, headers=headers, timeout=10)
-        return resp.text
-    except Exception as e:
-        return None
+    # 2. Standard Requests (HTTP errors such as 403/429 bot walls raise instead of being cached as pages)
+    resp = SESSION.get(url, timeout=10)
+    resp.raise_for_status()
+    if 'charset' not in resp.headers.get('Content-Type', '').lower():
+        resp.encoding = resp.apparent_encoding  # Detect it rather than fall back to Latin-1
+    return resp.text
 
 # MAIN UI LOOP
 st.title("Self-Healing Scraper")
@@ -197,59 +353,88 @@ with col1:
 
         status = st.status("Initializing Agent...", expanded=True)
         
-        # 1. Fetch
-        status.write(f"🌐 Connecting to {url}...")
-        html = fetch_html(url)
+        # Progress log: one element re-rendered in place instead of a new element per message
+        log_box = status.empty()
+        log = []
+        def log_write(message, flush=True):
+            log.append(message)
+            if flush:  # Back-to-back messages can skip the round-trip and ride the next one
+                log_box.markdown("\n\n".join(log))
+        
+        # 1. Fetch (a cold model load overlaps with the network round-trip)
+        get_executor().submit(warm_ollama)
+        log_write(f"🌐 Connecting to {url}...")
+        if needs_stealth(url):
+            st.toast("🛡️ Anti-Bot Detected: Switching to Stealth Mode...", icon="🤖")
+        try:
+            html = fetch_html(url)
+        except Exception as e:
+            status.update(label=f"❌ Failed to load page: {e}", state="error")
+            st.stop()
         if not html:
             status.update(label="❌ Failed to load page.", state="error")
             st.stop()
             
-        soup = BeautifulSoup(html, 'html.parser')
+        # Parse once; every stage below shares this tree
+        tree = fast_dom.parse(html)
         
-        # 2. Try Cache (Simulation)
-        cached_selector = ".old-broken-selector" if simulate_break else None
+        # 2. Try Cache
+        cache_key = selector_cache_key(url, intent)
+        cached_selector = ".old-broken-selector" if simulate_break else SELECTOR_CACHE.get(cache_key)
         if cached_selector:
-            status.write(f"⚡ Trying Cached Selector: `{cached_selector}`")
-            time.sleep(0.5)
-            # It will fail
-            status.write("❌ Cache Failed! Element not found.")
+            log_write(f"⚡ Trying Cached Selector: `{cached_selector}`")
+            try:
+                element = fast_dom.select_one(tree, cached_selector)
+            except Exception:
+                element = None
+            if element is not None and len(fast_dom.text(element, separator='')) > 0:
+                result = fast_dom.text(element, separator='')
+                status.update(label=f"✅ Cache Hit! Result: {result}", state="complete")
+                st.success(result)
+                st.stop()
+            log_write("❌ Cache Failed! Element not found.", flush=False)
             
-        # 3. Try JSON-LD (Fastest Path)
-        status.write("🔍 Checking JSON-LD Structured Data...")
-        json_data = ScraperLogic.parse_json_ld(soup)
+        # 3. Try JSON-LD (Fastest Path) -- only price is answered from metadata, so skip it otherwise
         subject = ScraperLogic.extract_subject(intent)
-        
-        if 'price' in subject and 'price' in json_data:
-            status.update(label=f"✅ Found in Metadata: {json_data['price']}", state="complete")
-            st.success(f"Extracted: {json_data['price']}")
-            st.stop()
+        if 'price' in subject:
+            log_write("🔍 Checking JSON-LD Structured Data...")
+            json_data = ScraperLogic.parse_json_ld(fast_dom.json_ld_blocks(tree))
+            if 'price' in json_data:
+                status.update(label=f"✅ Found in Metadata: {json_data['price']}", state="complete")
+                st.success(f"Extracted: {json_data['price']}")
+                st.stop()
             
         # 4. Trigger AI Healing
-        status.write("🚑 Engaging AI Healing Protocol...")
+        log_write("🚑 Engaging AI Healing Protocol...", flush=False)
         
         # Context Engineering
-        status.write(f"🧠 Focusing vision on subject: '{subject}'")
-        focused_html, text_structure = ScraperLogic.smart_clean_html(html, subject)
+        log_write(f"🧠 Focusing vision on subject: '{subject}'", flush=False)
+        focused_html, text_structure = ScraperLogic.smart_clean_html(tree, subject)
         
         # Strategy A: Generate Selector
-        status.write("💡 Generating new CSS Selector...")
+        log_write("💡 Generating new CSS Selector...")
         new_selector = generate_selector(focused_html, intent)
-        status.write(f"👉 AI Suggested: `{new_selector}`")
+        log_write(f"👉 AI Suggested: `{new_selector}`")
         
-        try:
-            element = soup.select_one(new_selector)
-            if element and len(element.get_text(strip=True)) > 0:
-                result = element.get_text(strip=True)
-                status.update(label=f"✅ HEALED (Selector)! Result: {result}", state="complete")
-                st.success(result)
-                st.balloons()
-                st.stop()
-        except:
-            status.write("⚠️ Selector failed. Switching to Text Extraction...")
+        # Reject malformed/hallucinated selectors at compile time, before any tree walk
+        if not fast_dom.is_valid_selector(new_selector):
+            log_write("⚠️ Not a valid CSS Selector. Switching to Text Extraction...", flush=False)
+        else:
+            try:
+                element = fast_dom.select_one(tree, new_selector)
+                if element is not None and len(fast_dom.text(element, separator='')) > 0:
+                    result = fast_dom.text(element, separator='')
+                    SELECTOR_CACHE.set(cache_key, new_selector)
+                    status.update(label=f"✅ HEALED (Selector)! Result: {result}", state="complete")
+                    st.success(result)
+                    st.balloons()
+                    st.stop()
+            except:
+                log_write("⚠️ Selector failed. Switching to Text Extraction...", flush=False)
             
         # Strategy B: Direct Text Extraction (Fallback)
-        status.write("🛡️ Fallback: Reading Page Text...")
-        direct_result = direct_extraction(text_structure[:4000], intent)
+        log_write("🛡️ Fallback: Reading Page Text...")
+        direct_result = direct_extraction(text_structure()[:4000], intent)
         
         if direct_result:
             status.update(label=f"✅ HEALED (Text)! Result: {direct_result}", state="complete")
@@ -260,13 +445,12 @@ with col1:
 
 with col2:
     st.info("ℹ️ **System Status**")
-    try:
-        req = requests.get("http://localhost:11434/api/tags")
-        if req.status_code == 200:
-            st.success("🟢 Ollama Online")
-        else:
-            st.error("🔴 Ollama Offline")
-    except:
+    probe_status = ollama_status()
+    if probe_status == 200:
+        st.success("🟢 Ollama Online")
+    elif probe_status is not None:
+        st.error("🔴 Ollama Offline")
+    else:
         st.error("🔴 Ollama Connection Failed")
         
     st.write("---")
@@ -0,0 +1,83 @@
+"""
+Fast DOM Helpers
+================
+Thin wrapper around lxml (libxml2, C) for the scraper's hot path.
+
+BeautifulSoup walks its tree in pure Python, which dominates CPU time on large
+anti-bot pages. Everything here delegates the heavy lifting to libxml2.
+"""
+
+import copy
+from functools import lru_cache
+
+from cssselect import HTMLTranslator, SelectorError
+from lxml import etree
+from lxml import html as lxml_html
+
+NOISE_TAGS = ("script", "style", "footer", "nav", "header", "svg", "button", "meta", "noscript", "iframe", "ad")
+
+_UTF8_PARSER = lxml_html.HTMLParser(encoding="utf-8")
+# Script/style bodies aren't page text (BeautifulSoup's get_text skips them too); this also hides kept JSON-LD
+_TEXT_NODES = etree.XPath(".//text()[not(ancestor::script) and not(ancestor::style)]", smart_strings=False)
+# One XPath union evaluated in C instead of a Python-level walk per tag
+_NOISE = etree.XPath(" | ".join(
+    "//script[not(@type='application/ld+json')]" if tag == "script" else f"//{tag}" for tag in NOISE_TAGS
+))
+_JSON_LD_TEXT = etree.XPath("//script[@type='application/ld+json']/text()", smart_strings=False)
+_CSS_TRANSLATOR = HTMLTranslator()
+
+def parse(html_content):
+    """
+    Parses an HTML document (str or bytes) into an lxml tree rooted at <html>.
+    Never raises on element-less input: like BeautifulSoup, it yields an empty document instead.
+    """
+    try:
+        if isinstance(html_content, str):
+            # lxml refuses str input carrying an XML encoding declaration, so hand it UTF-8 bytes
+            return lxml_html.document_fromstring(html_content.encode("utf-8", "replace"), parser=_UTF8_PARSER)
+        return lxml_html.document_fromstring(html_content)
+    except etree.ParserError:
+        # "Document is empty": whitespace, comment, doctype or XML-declaration-only pages
+        return lxml_html.document_fromstring("<html><body></body></html>")
+
+def strip_noise(tree):
+    """Removes non-content tags in place, preserving JSON-LD scripts."""
+    for el in _NOISE(tree):
+        el.drop_tree()  # Keeps the tail text, like BeautifulSoup's decompose()
+    return tree
+
+def clone(tree):
+    """Deep copy of a tree, so destructive cleaning doesn't touch the caller's DOM."""
+    return copy.deepcopy(tree)
+
+def text(node, separator="\n"):
+    """Equivalent of BeautifulSoup's get_text(separator=separator, strip=True)."""
+    return separator.join(s for s in (t.strip() for t in _TEXT_NODES(node)) if s)
+
+def json_ld_blocks(tree):
+    """Raw text of every <script type="application/ld+json"> in the document."""
+    return _JSON_LD_TEXT(tree)
+
+@lru_cache(maxsize=256)
+def compile_selector(selector):
+    """CSS selector -> compiled XPath, memoized. Raises SelectorError on bad syntax before touching any tree."""
+    return etree.XPath(_CSS_TRANSLATOR.css_to_xpath(selector))
+
+def is_valid_selector(selector):
+    """Cheap check for LLM output that isn't a usable CSS selector (explanations, empty replies, ...)."""
+    if not selector:
+        return False
+    try:
+        compile_selector(selector)
+        return True
+    except (SelectorError, etree.XPathError):
+        return False
+
+def select_one(tree, selector):
+    """First element matching a CSS selector, or None. Raises on invalid selectors."""
+    matches = compile_selector(selector)(tree)
+    return matches[0] if matches else None
+
+def outer_html(node):
+    """Serializes a node (including its own tag) back to a string."""
+    return lxml_html.tostring(node, encoding="unicode")